@@ -18,63 +18,43 @@ Bitget Spot WebSocket - Account Channel (Private)
 """
 
 import asyncio
-import json
-import ssl
-import websockets
 import hmac
-import hashlib
-import base64
+import binascii
 import time
-from datetime import datetime
+from base_channel import load_config, install_uvloop, BaseChannel, json_loads, json_dumps
 
-def load_config():
-    """Загрузка конфигурации из файла"""
-    try:
-        with open('/Users/timurbogatyrev/Documents/VS Code/Algo/ExchangeAPI/Bitget/config.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("❌ Файл config.json не найден!")
-        return None
+# Готовый JSON-фрейм подписки на баланс аккаунта
+SUBSCRIBE_ACCOUNT_FRAME = json_dumps({
+    "op": "subscribe",
+    "args": [
+        {
+            "instType": "SPOT",
+            "channel": "account",
+            "instId": "default"
+        }
+    ]
+})
 
-class SpotAccountChannel:
+class SpotAccountChannel(BaseChannel):
     def __init__(self, config):
-        self.config = config
-        self.ws = None
+        super().__init__(config)
+        self._secret_bytes = config['secretKey'].encode('utf-8')
                 
     def generate_signature(self, timestamp, method, request_path, body=''):
         """Генерация подписи для аутентификации"""
         message = str(timestamp) + method + request_path + body
-        signature = hmac.new(
-            self.config['secretKey'].encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).digest()
-        return base64.b64encode(signature).decode('utf-8')
+        # Однократный вызов HMAC в C (OpenSSL), ключ закодирован заранее
+        signature = hmac.digest(self._secret_bytes, message.encode('utf-8'), 'sha256')
+        return binascii.b2a_base64(signature, newline=False).decode('ascii')
     
     async def connect(self):
         """Подключение к WebSocket"""
-        try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
-            # Используем приватный WebSocket URL
-            private_ws_url = self.config.get('privateWsURL', 'wss://ws.bitget.com/v2/ws/private')
-            
-            self.ws = await websockets.connect(
-                private_ws_url,
-                ssl=ssl_context,
-                ping_interval=30,
-                ping_timeout=10
-            )
-            print("✅ Подключение к Private Spot WebSocket установлено")
-            return True
-        except Exception as e:
-            print(f"❌ Ошибка подключения: {e}")
-            return False
+        # Используем приватный WebSocket URL
+        private_ws_url = self.config.get('privateWsURL', 'wss://ws.bitget.com/v2/ws/private')
+        return await self._connect(private_ws_url, "Private Spot WebSocket")
     
-    async def authenticate(self):
-        """Аутентификация для приватных каналов"""
+    def _send_login(self):
+        """Отправка запроса аутентификации без ожидания ответа"""
         timestamp = str(int(time.time()))
         method = 'GET'
         request_path = '/user/verify'
@@ -93,89 +73,64 @@ class SpotAccountChannel:
             ]
         }
         
-        if self.ws:
-            await self.ws.send(json.dumps(auth_message))
-            print("🔐 Отправлен запрос аутентификации...")
-            
-            # Ждем ответ аутентификации
-            try:
-                response = await asyncio.wait_for(self.ws.recv(), timeout=10)
-                data = json.loads(response)
-                if data.get('event') == 'login':
-                    if str(data.get('code')) == '0':  # Преобразуем в строку для сравнения
-                        print("✅ Аутентификация успешна!")
-                        return True
-                    else:
-                        print(f"❌ Ошибка аутентификации: {data.get('msg', 'Unknown error')}")
-                        return False
+        self._send(json_dumps(auth_message))
+        print("🔐 Отправлен запрос аутентификации...")
+    
+    async def _await_login_ack(self):
+        """Ожидание ответа на запрос аутентификации"""
+        try:
+            response = await asyncio.wait_for(self.ws.recv(), timeout=10)
+            data = json_loads(response)
+            if data.get('event') == 'login':
+                if str(data.get('code')) == '0':  # Преобразуем в строку для сравнения
+                    print("✅ Аутентификация успешна!")
+                    return True
                 else:
-                    print(f"❌ Неожиданный ответ: {data}")
+                    print(f"❌ Ошибка аутентификации: {data.get('msg', 'Unknown error')}")
                     return False
-            except asyncio.TimeoutError:
-                print("❌ Таймаут аутентификации")
-                return False
-            except Exception as e:
-                print(f"❌ Ошибка при получении ответа аутентификации: {e}")
+            else:
+                print(f"❌ Неожиданный ответ: {data}")
                 return False
+        except asyncio.TimeoutError:
+            print("❌ Таймаут аутентификации")
+            return False
+        except Exception as e:
+            print(f"❌ Ошибка при получении ответа аутентификации: {e}")
+            return False
+    
+    async def authenticate(self):
+        """Аутентификация для приватных каналов"""
+        if self.ws:
+            self._send_login()
+            return await self._await_login_ack()
         
         return False
     
+    async def authenticate_and_subscribe(self):
+        """
+        Аутентификация и подписка за один RTT:
+        подписка отправляется сразу за login, не дожидаясь его подтверждения
+        """
+        if not self.ws:
+            return False
+        
+        self._send_login()
+        authenticated, _ = await asyncio.gather(self._await_login_ack(), self.subscribe_account())
+        return authenticated
+    
     async def subscribe_account(self):
         """Подписка на изменения баланса аккаунта"""
-        subscribe_message = {
-            "op": "subscribe",
-            "args": [
-                {
-                    "instType": "SPOT",
-                    "channel": "account",
-                    "instId": "default"
-                }
-            ]
-        }
-        
         if self.ws:
-            await self.ws.send(json.dumps(subscribe_message))
+            self._send(SUBSCRIBE_ACCOUNT_FRAME)
             print("📡 Подписка на изменения баланса аккаунта")
     
     def format_balance_data(self, data):
-        """Вывод оригинальных JSON данных от биржи"""
-        print(json.dumps(data, indent=4, ensure_ascii=False))
+        """Вывод оригинальных JSON данных от биржи (запись - в потоке вывода)"""
+        self._output.put(self.render_message(data))
 
     def show_portfolio_summary(self, *args, **kwargs):
         """Метод удален - показываем только оригинальные JSON"""
         pass
-    async def handle_message(self, message):
-        """Обработка входящих сообщений - вывод оригинальных JSON"""
-        try:
-            data = json.loads(message)
-            print(json.dumps(data, indent=4, ensure_ascii=False))
-            
-            # Пинг-понг
-            if 'ping' in data:
-                pong_message = {'pong': data['ping']}
-                if self.ws:
-                    await self.ws.send(json.dumps(pong_message))
-        
-        except json.JSONDecodeError:
-            print(f"❌ Ошибка декодирования JSON: {message}")
-        except Exception as e:
-            print(f"❌ Ошибка обработки сообщения: {e}")
-    async def listen(self):
-        """Прослушивание сообщений"""
-        try:
-            if self.ws:
-                async for message in self.ws:
-                    await self.handle_message(message)
-        except websockets.exceptions.ConnectionClosed:
-            print("🔌 WebSocket соединение закрыто")
-        except Exception as e:
-            print(f"❌ Ошибка прослушивания: {e}")
-    
-    async def disconnect(self):
-        """Отключение от WebSocket"""
-        if self.ws:
-            await self.ws.close()
-            print("🔌 Отключение от WebSocket")
 
 async def monitor_account_balance():
     """Мониторинг - показывает оригинальные JSON"""
@@ -200,7 +155,10 @@ async def monitor_account_balance():
         if not await account_client.connect():
             return
         
-        await account_client.authenticate()
+        # Ждем успешной аутентификации (без нее приватные данные не придут)
+        if not await account_client.authenticate_and_subscribe():
+            print("❌ Не удалось аутентифицироваться")
+            return
         
         print("🔄 Мониторинг изменений баланса...")
         print("💡 Нажмите Ctrl+C для остановки")
@@ -240,7 +198,10 @@ async def balance_tracker_with_timer():
         if not await account_client.connect():
             return
         
-        await account_client.authenticate()
+        # Ждем успешной аутентификации (без нее приватные данные не придут)
+        if not await account_client.authenticate_and_subscribe():
+            print("❌ Не удалось аутентифицироваться")
+            return
         
         print(f"🔄 Мониторинг баланса в течение {duration} секунд...")
         print("💡 Нажмите Ctrl+C для остановки")
@@ -278,4 +239,5 @@ async def main():
         print("\\n👋 Программа остановлена")
 
 if __name__ == "__main__":
+    install_uvloop()
     asyncio.run(main())
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Bitget Spot WebSocket - общая база для каналов
+
+Подключение, очередь исходящих сообщений, чтение сокета, пинг-понг
+и ограниченный по частоте вывод оригинальных JSON сообщений от биржи.
+Конкретные каналы (стакан, аккаунт) наследуются от BaseChannel
+и добавляют только подписку и свою логику.
+
+Остальные каналы берут отсюда разбор/сериализацию JSON и поток вывода OutputWriter.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import queue
+import socket
+import ssl
+import sys
+import threading
+import websockets
+import time
+from typing import Any, Optional
+
+# orjson (если установлен) - быстрый разбор/сериализация JSON; разбирает bytes напрямую,
+# результат сериализации - bytes
+try:
+    import orjson
+    json_loads = orjson.loads
+    
+    def json_dumps(obj):
+        """Компактный JSON в bytes для отправки"""
+        return orjson.dumps(obj)
+    
+    def json_pretty(obj):
+        """JSON с отступами и переводом строки в bytes для вывода"""
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+except ImportError:
+    json_loads = json.loads
+    # Кодировщик создается один раз (json.dumps с параметрами строит новый на каждый вызов)
+    _json_encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+    
+    def json_dumps(obj):
+        """Компактный JSON в bytes для отправки"""
+        return _json_encode(obj).encode('utf-8')
+    
+    def json_pretty(obj):
+        """JSON с отступами и переводом строки в bytes для вывода"""
+        return (json.dumps(obj, indent=2, ensure_ascii=False) + "\n").encode('utf-8')
+
+# msgspec (если установлен) достает из кадра только служебные поля (ping, arg.channel, arg.instId);
+# полный разбор JSON выполняется лишь для сообщений, которые реально выводятся
+try:
+    import msgspec
+    
+    class FrameArg(msgspec.Struct):
+        channel: Optional[str] = None
+        instId: Optional[str] = None
+    
+    class FrameEnvelope(msgspec.Struct):
+        arg: Optional[FrameArg] = None
+        ping: Any = None
+    
+    decode_envelope = msgspec.json.Decoder(FrameEnvelope).decode
+    DECODE_ERRORS = (json.JSONDecodeError, msgspec.DecodeError)
+    
+    def pretty_raw(message):
+        """Отступы для исходного JSON-кадра (bytes) без создания Python-объектов"""
+        return msgspec.json.format(message, indent=2) + b"\n"
+except ImportError:
+    decode_envelope = None
+    DECODE_ERRORS = (json.JSONDecodeError,)
+    
+    def pretty_raw(message):
+        """Отступы для исходного JSON-кадра (bytes) через полный разбор"""
+        return json_pretty(json_loads(message))
+
+# Путь к конфигурации можно переопределить переменной окружения BITGET_CONFIG
+CONFIG_PATH = os.environ.get(
+    'BITGET_CONFIG', '/Users/timurbogatyrev/Documents/VS Code/Algo/ExchangeAPI/Bitget/config.json'
+)
+
+@functools.lru_cache(maxsize=1)
+def load_config():
+    """Загрузка конфигурации из файла (читается и разбирается один раз за запуск)"""
+    try:
+        with open(CONFIG_PATH, 'rb') as f:
+            return json_loads(f.read())
+    except FileNotFoundError:
+        print("❌ Файл config.json не найден!")
+        return None
+
+def install_uvloop():
+    """uvloop - более быстрый event loop (если установлен)"""
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
+# SSL контекст для всех каналов создается один раз на модуль (с проверкой сертификата и имени хоста):
+# CA-хранилище разбирается один раз, кэш TLS-сессий переиспользуется при переподключениях.
+# Для TLS 1.2 - только ECDHE + AES-GCM (аппаратный AES-NI); ALPN http/1.1 - рукопожатие
+# WebSocket идет поверх HTTP/1.1
+SSL_CONTEXT = ssl.create_default_context()
+SSL_CONTEXT.set_ciphers("ECDHE+AESGCM:!aNULL")
+SSL_CONTEXT.set_alpn_protocols(['http/1.1'])
+
+# Минимальный интервал между выводами сообщений в терминал (сек)
+PRINT_INTERVAL = 0.1
+
+# Размер очереди входящих сообщений: при переполнении чтение сокета ждет обработчик;
+# самые старые кадры отбрасываются (со счетчиком) только если все подписки - каналы-снимки
+INBOX_SIZE = 1000
+
+# Низколатентный режим (только Linux, ценой энергопотребления):
+# BITGET_BUSY_POLL=<мкс> - занятый опрос сокета (SO_BUSY_POLL) вместо ожидания прерывания
+# BITGET_PIN_CPU=<номер> - привязка процесса к одному ядру CPU
+# Значения разбираются при подключении: ошибка в них - предупреждение, а не падение скрипта
+BUSY_POLL = os.environ.get('BITGET_BUSY_POLL')
+PIN_CPU = os.environ.get('BITGET_PIN_CPU')
+SO_BUSY_POLL = getattr(socket, 'SO_BUSY_POLL', 46)
+
+def apply_low_latency(ws):
+    """Настройка сокета и процесса для низкой задержки (если включено через окружение)"""
+    try:
+        if PIN_CPU is not None:
+            os.sched_setaffinity(0, {int(PIN_CPU)})
+    except (AttributeError, OSError, ValueError) as e:
+        print(f"⚠️ Привязка к CPU недоступна: {e}")
+    try:
+        busy_poll_usec = int(BUSY_POLL) if BUSY_POLL else 0
+        if busy_poll_usec:
+            sock = ws.transport.get_extra_info('socket')
+            # TCP_NODELAY asyncio выставляет сам
+            sock.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, busy_poll_usec)
+    except (AttributeError, OSError, ValueError) as e:
+        print(f"⚠️ Низколатентный режим недоступен: {e}")
+
+# Начало pong-ответа (значение ping дописывается как JSON)
+PONG_PREFIX = b'{"pong":'
+
+# Строковые представления нуля в числовых полях (для них float()/int() не нужен)
+ZERO_STRINGS = frozenset(('0', '', '0.0', 0))
+
+def to_float(value):
+    """Число из поля биржи; "" (неисполненный ордер), null и нечисловые значения - 0.0, кадр не теряется"""
+    try:
+        return float(value) if value not in ZERO_STRINGS else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+def to_int(value):
+    """Целое (время в мс) из поля биржи; "", null и нечисловые значения - 0"""
+    try:
+        return int(value) if value not in ZERO_STRINGS else 0
+    except (TypeError, ValueError):
+        return 0
+
+class OutputWriter:
+    """
+    Поток вывода: event loop только ставит задания в очередь, а поток форматирует
+    накопленные задания и пишет их в stdout одной записью.
+    Задание - готовые bytes или исходные данные с функцией форматирования (render).
+    """
+    
+    def __init__(self, name, maxsize=0):
+        # maxsize > 0 - при переполнении задание пропускается и учитывается в dropped
+        self._q = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+    
+    def put(self, payload, render=None):
+        """Постановка задания на вывод (не блокирует event loop)"""
+        try:
+            self._q.put_nowait((render, payload))
+        except queue.Full:
+            self.dropped += 1
+    
+    def _run(self):
+        """Цикл потока: все накопленные задания - одной записью в stdout; None - остановка"""
+        out = sys.stdout.buffer
+        while True:
+            items = [self._q.get()]
+            while True:
+                try:
+                    items.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            buf = bytearray()
+            stop = False
+            for item in items:
+                if item is None:
+                    stop = True
+                    continue
+                render, payload = item
+                try:
+                    buf += render(payload) if render else payload
+                except Exception:
+                    # Ошибка разбора уже выведена обработчиком сообщений
+                    pass
+            if buf:
+                # Текст print() может лежать в буфере TextIOWrapper (до 8 КБ при выводе в pipe):
+                # сбрасываем его первым, чтобы сохранить порядок вывода
+                sys.stdout.flush()
+                out.write(buf)
+                out.flush()
+            if stop:
+                return
+    
+    def _stop(self, timeout):
+        """Остановка потока после вывода всего, что уже поставлено в очередь"""
+        self._q.put(None)
+        self._thread.join(timeout)
+    
+    async def close(self, timeout=5):
+        """Дождаться вывода очереди (ожидание - в пуле потоков, не в event loop)"""
+        await asyncio.get_running_loop().run_in_executor(None, self._stop, timeout)
+        if self.dropped:
+            print(f"⚠️ Пропущено при выводе (переполнение очереди): {self.dropped}")
+
+class OutboundQueue:
+    """
+    Примесь для каналов: очередь исходящих сообщений и фоновая задача их отправки.
+    Канал вызывает _init_outbound() в __init__, _start_writer() после подключения
+    и _stop_writer() при отключении; _send() ставит сообщение в очередь без ожидания.
+    """
+    
+    def _init_outbound(self):
+        """Создание очереди исходящих сообщений (задача отправки - после подключения)"""
+        self._out_q = asyncio.Queue()
+        self._writer_task = None
+    
+    def _start_writer(self):
+        """Запуск фоновой отправки для текущего self.ws"""
+        self._writer_task = asyncio.create_task(self._writer_loop())
+    
+    def _stop_writer(self):
+        """Остановка фоновой отправки"""
+        if self._writer_task:
+            self._writer_task.cancel()
+    
+    def _send(self, message):
+        """Постановка исходящего сообщения (bytes или str) в очередь на отправку"""
+        self._out_q.put_nowait(message)
+    
+    async def _writer_loop(self):
+        """Фоновая отправка исходящих сообщений из очереди (каждое - отдельный ws.send)"""
+        while True:
+            message = await self._out_q.get()
+            try:
+                # Bitget принимает op-сообщения только текстовыми фреймами (json_dumps дает bytes)
+                await self.ws.send(message, text=True)
+            except websockets.exceptions.ConnectionClosed:
+                return
+            except Exception as e:
+                # Ошибка одного сообщения не останавливает отправку следующих
+                print(f"❌ Ошибка отправки: {e}")
+
+class BaseChannel(OutboundQueue):
+    # Каналы-снимки, для которых между выводами остается только последний кадр по символу;
+    # кадры остальных каналов (баланс, инкрементальный стакан) выводятся все, по порядку
+    COALESCE_CHANNELS = frozenset()
+    
+    def __init__(self, config):
+        self.config = config
+        self.ws = None
+        # Кадры, ожидающие вывода (в порядке приема): ключ - (канал, символ) для каналов-снимков,
+        # иначе - порядковый номер кадра
+        self._pending = {}
+        self._seq = 0
+        self._last_print = 0.0
+        self._in_q = asyncio.Queue(maxsize=INBOX_SIZE)
+        # Разрешено ли отбрасывать старые кадры при переполнении очереди (по умолчанию - нет:
+        # кадры баланса и инкрементального стакана терять нельзя) и счетчик отброшенных
+        self._drop_oldest = False
+        self._dropped = 0
+        self._init_outbound()
+        self._output = OutputWriter(f"{type(self).__name__}-output")
+    
+    async def _connect(self, url, label):
+        """Подключение к WebSocket по адресу url"""
+        try:
+            self.ws = await websockets.connect(
+                url,
+                ssl=SSL_CONTEXT,
+                ping_interval=30,
+                ping_timeout=10,
+                # Без permessage-deflate: входящий фрейм не проходит распаковку zlib
+                compression=None
+            )
+            apply_low_latency(self.ws)
+            self._start_writer()
+            print(f"✅ Подключение к {label} установлено")
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка подключения: {e}")
+            return False
+    
+    def render_message(self, data):
+        """Оригинальные JSON данные от биржи с отступами, готовые к записи в stdout"""
+        return json_pretty(data)
+    
+    def print_latest(self):
+        """Вывод накопленных кадров (для каналов-снимков - последнего по каждому символу)"""
+        if self._pending:
+            # Отступы для исходных байтов выводимых кадров - в потоке вывода
+            for message in self._pending.values():
+                self._output.put(message, pretty_raw)
+            self._pending.clear()
+            self._last_print = time.monotonic()
+    
+    def _buffer_frame(self, channel, inst_id, message):
+        """Постановка кадра в буфер вывода; снимок заменяет предыдущий кадр того же канала и символа"""
+        if channel in self.COALESCE_CHANNELS:
+            key = (channel, inst_id)
+            # Замененный кадр переходит в конец - порядок вывода по последнему приему
+            self._pending.pop(key, None)
+        else:
+            self._seq += 1
+            key = self._seq
+        self._pending[key] = message
+    
+    async def _printer_loop(self):
+        """Фоновый вывод накопленных кадров не чаще PRINT_INTERVAL"""
+        while True:
+            await asyncio.sleep(PRINT_INTERVAL)
+            self.print_latest()
+    
+    async def handle_message(self, message):
+        """Обработка входящих сообщений - вывод оригинальных JSON"""
+        try:
+            if decode_envelope:
+                envelope = decode_envelope(message)
+                ping = envelope.ping
+                arg = envelope.arg
+                channel, inst_id = (arg.channel, arg.instId) if arg else (None, None)
+            else:
+                data = json_loads(message)
+                ping = data.get('ping')
+                arg = data.get('arg')
+                channel, inst_id = (arg.get('channel'), arg.get('instId')) if isinstance(arg, dict) else (None, None)
+            
+            # Пинг-понг
+            if ping is not None:
+                if self.ws:
+                    self._send(PONG_PREFIX + json_dumps(ping) + b'}')
+            
+            # Кадр сохраняется как есть, вывод накопленного - не чаще PRINT_INTERVAL
+            self._buffer_frame(channel, inst_id, message)
+            if time.monotonic() - self._last_print > PRINT_INTERVAL:
+                self.print_latest()
+        
+        except DECODE_ERRORS:
+            print(f"❌ Ошибка декодирования JSON: {message}")
+        except Exception as e:
+            print(f"❌ Ошибка обработки сообщения: {e}")
+    
+    async def _consumer_loop(self):
+        """Обработка принятых сообщений отдельно от чтения сокета"""
+        while True:
+            message = await self._in_q.get()
+            await self.handle_message(message)
+    
+    async def listen(self):
+        """Прослушивание сообщений"""
+        printer_task = asyncio.create_task(self._printer_loop())
+        consumer_task = asyncio.create_task(self._consumer_loop())
+        try:
+            if self.ws:
+                # Текстовые фреймы получаем как bytes - без декодирования и проверки UTF-8
+                while True:
+                    message = await self.ws.recv(decode=False)
+                    if self._drop_oldest and self._in_q.full():
+                        # Только снимки: самое старое отбрасывается - для вывода важен свежий снимок
+                        self._in_q.get_nowait()
+                        self._dropped += 1
+                    await self._in_q.put(message)
+        except websockets.exceptions.ConnectionClosed:
+            print("🔌 WebSocket соединение закрыто")
+        except Exception as e:
+            print(f"❌ Ошибка прослушивания: {e}")
+        finally:
+            consumer_task.cancel()
+            printer_task.cancel()
+            while not self._in_q.empty():
+                await self.handle_message(self._in_q.get_nowait())
+            self.print_latest()
+            if self._dropped:
+                print(f"⚠️ Отброшено устаревших кадров (переполнение очереди): {self._dropped}")
+    
+    async def disconnect(self):
+        """Отключение от WebSocket"""
+        self._stop_writer()
+        # Дожидаемся вывода всего, что уже поставлено в очередь
+        await self._output.close()
+        if self.ws:
+            await self.ws.close()
+            print("🔌 Отключение от WebSocket")
@@ -18,99 +18,54 @@ Bitget Spot WebSocket - Depth Channel (Order Book)
 """
 
 import asyncio
-import json
-import ssl
-import websockets
-from datetime import datetime
+import functools
+from base_channel import load_config, install_uvloop, BaseChannel, json_dumps
 
-def load_config():
-    """Загрузка конфигурации из файла"""
-    try:
-        with open('/Users/timurbogatyrev/Documents/VS Code/Algo/ExchangeAPI/Bitget/config.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("❌ Файл config.json не найден!")
-        return None
+@functools.lru_cache(maxsize=None)
+def build_subscribe_frame(symbol, depth_level):
+    """Готовый JSON-фрейм подписки на стакан (кэшируется на пару символ/глубина)"""
+    return json_dumps({
+        "op": "subscribe",
+        "args": [
+            {
+                "instType": "SPOT",
+                "channel": depth_level,
+                "instId": symbol
+            }
+        ]
+    })
 
-class SpotDepthChannel:
+class SpotDepthChannel(BaseChannel):
+    # books5/books15 - полные снимки: между выводами достаточно последнего по символу.
+    # books - снимок и затем инкрементальные обновления: пропуск любого ломает стакан, выводятся все
+    COALESCE_CHANNELS = frozenset(('books5', 'books15'))
+    
     def __init__(self, config):
-        self.config = config
-        self.ws = None        
+        super().__init__(config)
+        self.symbols = []
+        # Уровни стакана, на которые есть подписка
+        self.depth_levels = set()
+        
     async def connect(self):
         """Подключение к WebSocket"""
-        try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
-            self.ws = await websockets.connect(
-                self.config['wsURL'],
-                ssl=ssl_context,
-                ping_interval=30,
-                ping_timeout=10
-            )
-            print("✅ Подключение к Spot WebSocket установлено")
-            return True
-        except Exception as e:
-            print(f"❌ Ошибка подключения: {e}")
-            return False
+        return await self._connect(self.config['wsURL'], "Spot WebSocket")
     
     async def subscribe_depth(self, symbol, depth_level="books5"):
         """
         Подписка на стакан заявок
         depth_level: books5, books15, books
         """
-        subscribe_message = {
-            "op": "subscribe",
-            "args": [
-                {
-                    "instType": "SPOT",
-                    "channel": depth_level,
-                    "instId": symbol.upper()
-                }
-            ]
-        }
-        
         if self.ws:
-            await self.ws.send(json.dumps(subscribe_message))
+            self._send(build_subscribe_frame(symbol.upper(), depth_level))
             self.symbols.append(symbol.upper())
+            self.depth_levels.add(depth_level)
+            # Старые кадры можно отбрасывать, только пока все подписки - снимки (без books)
+            self._drop_oldest = self.depth_levels <= self.COALESCE_CHANNELS
             print(f"📡 Подписка на стакан {symbol} ({depth_level})")
     
     def format_depth_data(self, data):
-        """Вывод оригинальных JSON данных от биржи"""
-        print(json.dumps(data, indent=4, ensure_ascii=False))
-    async def handle_message(self, message):
-        """Обработка входящих сообщений - вывод оригинальных JSON"""
-        try:
-            data = json.loads(message)
-            print(json.dumps(data, indent=4, ensure_ascii=False))
-            
-            # Пинг-понг
-            if 'ping' in data:
-                pong_message = {'pong': data['ping']}
-                if self.ws:
-                    await self.ws.send(json.dumps(pong_message))
-        
-        except json.JSONDecodeError:
-            print(f"❌ Ошибка декодирования JSON: {message}")
-        except Exception as e:
-            print(f"❌ Ошибка обработки сообщения: {e}")
-    async def listen(self):
-        """Прослушивание сообщений"""
-        try:
-            if self.ws:
-                async for message in self.ws:
-                    await self.handle_message(message)
-        except websockets.exceptions.ConnectionClosed:
-            print("🔌 WebSocket соединение закрыто")
-        except Exception as e:
-            print(f"❌ Ошибка прослушивания: {e}")
-    
-    async def disconnect(self):
-        """Отключение от WebSocket"""
-        if self.ws:
-            await self.ws.close()
-            print("🔌 Отключение от WebSocket")
+        """Вывод оригинальных JSON данных от биржи (запись - в потоке вывода)"""
+        self._output.put(self.render_message(data))
 
 async def monitor_top5_depth():
     """Мониторинг - показывает оригинальные JSON"""
@@ -246,4 +201,5 @@ async def main():
         print("\n👋 Программа остановлена")
 
 if __name__ == "__main__":
+    install_uvloop()
     asyncio.run(main())
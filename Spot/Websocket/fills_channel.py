@@ -24,29 +24,86 @@ Bitget Spot WebSocket - Fills Channel (Private)
 """
 
 import asyncio
-import json
-import ssl
+from array import array
 import websockets
 import hmac
 import hashlib
 import base64
 import time
 from datetime import datetime
+from typing import Any, List
+from base_channel import (load_config, install_uvloop, SSL_CONTEXT, OutputWriter, json_loads,
+                          json_dumps, pretty_raw, DECODE_ERRORS, to_float, to_int)
 
-def load_config():
-    """Загрузка конфигурации из файла"""
-    try:
-        with open('/Users/timurbogatyrev/Documents/VS Code/Algo/ExchangeAPI/Bitget/config.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("❌ Файл config.json не найден!")
-        return None
+# Максимальный размер очереди вывода в stdout (при переполнении вывод пропускается со счетчиком)
+OUT_QUEUE_SIZE = 10000
+
+# Шаблоны вывода исполнения (форматируются одним вызовом format_map/format)
+FILL_TEMPLATE = (
+    "\n🎯 [{t}] ИСПОЛНЕНИЕ #{n}\n"
+    "💱 {inst}\n"
+    "🆔 Trade ID: {tid}\n"
+    "📋 Order ID: {oid}\n"
+    "{arrow} Сторона: {emoji} {side} │ Тип: {otype}\n"
+    "💰 Цена: ${price:,.6f}\n"
+    "📊 Размер: {size:,.6f}\n"
+    "💵 Сумма: ${value:,.2f}\n"
+)
+FEE_TEMPLATE = "💸 Комиссия: {:,.6f} {}\n"
+FEE_PERCENT_TEMPLATE = "📈 Комиссия: {:.4f}%\n"
+SEPARATOR_LINE = "─" * 50 + "\n"
+
+# msgspec (если установлен) достает из кадра только ping и поля исполнений из data[*];
+# остальные поля кадра (arg, action и т.п.) пропускаются без создания объектов.
+# Числовые поля не типизируются: "" в одном поле при строгом типе отбросил бы весь кадр
+# (исполнения пропали бы из статистики) - числа приводятся в record_entry через to_float/to_int
+try:
+    import msgspec
+    
+    class FillEntry(msgspec.Struct):
+        tradeId: Any = 'N/A'
+        orderId: Any = 'N/A'
+        instId: Any = 'N/A'
+        side: Any = 'N/A'
+        fillSize: Any = 0
+        fillPrice: Any = 0
+        orderType: Any = 'N/A'
+        feeAmount: Any = 0
+        feeCoin: Any = 'N/A'
+        fillTime: Any = 0
+    
+    class FillsFrame(msgspec.Struct):
+        ping: Any = None
+        data: List[FillEntry] = []
+    
+    decode_frame = msgspec.json.Decoder(FillsFrame).decode
+except ImportError:
+    decode_frame = None
 
 class SpotFillsChannel:
     def __init__(self, config):
         self.config = config
+        # Ключи для аутентификации берутся из конфигурации один раз
+        self._api_key = config['apiKey']
+        self._passphrase = config['passphrase']
+        self._secret_bytes = config['secretKey'].encode('utf-8')
         self.ws = None
-        self.fills_data = {}
+        # Исполнения хранятся по столбцам (SoA): компактные массивы array вместо словаря на каждую сделку;
+        # _fill_index - номер строки по tradeId
+        self._fill_index = {}
+        self._fill_size = array('d')
+        self._fill_price = array('d')
+        self._fee_amount = array('d')
+        self._fill_time = array('q')
+        self._received_at = array('d')
+        self._fill_is_buy = array('b')
+        self._order_ids = []
+        self._fill_symbol = array('i')
+        self._order_types = []
+        self._fee_coins = []
+        # Кэш префикса "ЧЧ:ММ:СС." - strftime вызывается не чаще раза в секунду
+        self._last_sec = -1
+        self._sec_prefix = ""
         self.update_count = 0
         self.trading_stats = {
             'total_fills': 0,
@@ -54,34 +111,42 @@ class SpotFillsChannel:
             'sell_fills': 0,
             'total_volume': 0,
             'total_fees': 0,
-            'pairs_traded': set()
+            'pairs_traded': {}
         }
+        # Таблица символов: instId -> номер (в порядке появления) и обратный список;
+        # в статистике pairs_traded - эта же таблица
+        self._sym_ids = self.trading_stats['pairs_traded']
+        self._symbols = []
+        # Очередь принятых сообщений (без ограничения - исполнения не отбрасываются)
+        self._in_q = asyncio.Queue()
+        # Запись в stdout - в отдельном потоке, не блокируя event loop
+        self._output = OutputWriter("fills-output", maxsize=OUT_QUEUE_SIZE)
         
     def generate_signature(self, timestamp, method, request_path, body=''):
         """Генерация подписи для аутентификации"""
-        message = str(timestamp) + method + request_path + body
-        signature = hmac.new(
-            self.config['secretKey'].encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).digest()
-        return base64.b64encode(signature).decode('utf-8')
+        # Сообщение собирается сразу в bytes, ключ закодирован заранее
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        message = b"%s%s%s%s" % (str(timestamp).encode('ascii'), method.encode('ascii'),
+                                 request_path.encode('utf-8'), body)
+        signature = hmac.new(self._secret_bytes, message, hashlib.sha256).digest()
+        return base64.b64encode(signature).decode('ascii')
     
     async def connect(self):
         """Подключение к WebSocket"""
         try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
             # Используем приватный WebSocket URL
             private_ws_url = self.config.get('privateWsURL', 'wss://ws.bitget.com/v2/ws/private')
             
             self.ws = await websockets.connect(
                 private_ws_url,
-                ssl=ssl_context,
+                ssl=SSL_CONTEXT,
                 ping_interval=30,
-                ping_timeout=10
+                ping_timeout=10,
+                # Больший буфер принятых фреймов - чтение не останавливается при кратком отставании обработки
+                max_queue=1024,
+                max_size=1 << 20,
+                compression=None
             )
             print("✅ Подключение к Private Spot WebSocket установлено")
             return True
@@ -101,8 +166,8 @@ class SpotFillsChannel:
             "op": "login",
             "args": [
                 {
-                    "apiKey": self.config['apiKey'],
-                    "passphrase": self.config['passphrase'],
+                    "apiKey": self._api_key,
+                    "passphrase": self._passphrase,
                     "timestamp": timestamp,
                     "sign": signature
                 }
@@ -110,13 +175,13 @@ class SpotFillsChannel:
         }
         
         if self.ws:
-            await self.ws.send(json.dumps(auth_message))
+            await self.ws.send(json_dumps(auth_message), text=True)
             print("🔐 Отправлен запрос аутентификации...")
             
             # Ждем ответ аутентификации
             try:
                 response = await asyncio.wait_for(self.ws.recv(), timeout=10)
-                data = json.loads(response)
+                data = json_loads(response)
                 if data.get('event') == 'login':
                     if str(data.get('code')) == '0':  # Преобразуем в строку для сравнения
                         print("✅ Аутентификация успешна!")
@@ -150,7 +215,7 @@ class SpotFillsChannel:
         }
         
         if self.ws:
-            await self.ws.send(json.dumps(subscribe_message))
+            await self.ws.send(json_dumps(subscribe_message), text=True)
             if symbol:
                 print(f"📡 Подписка на исполнения для {symbol}")
             else:
@@ -158,85 +223,151 @@ class SpotFillsChannel:
     
     def format_fill_data(self, data):
         """Форматирование данных исполнений"""
-        if not data or 'data' not in data:
+        # Подтверждения подписки, пинги, ошибки и кадры других каналов пропускаются сразу
+        if not data:
+            return
+        arg = data.get('arg')
+        if not arg or arg.get('channel') != 'fills':
+            return
+        rows = data.get('data')
+        if not rows:
             return
         
-        for fill in data['data']:
-            self.update_count += 1
-            
-            trade_id = fill.get('tradeId', 'N/A')
-            order_id = fill.get('orderId', 'N/A')
-            inst_id = fill.get('instId', 'N/A')
-            side = fill.get('side', 'N/A')
-            fill_size = float(fill.get('fillSize', 0))
-            fill_price = float(fill.get('fillPrice', 0))
-            order_type = fill.get('orderType', 'N/A')
-            fee_amount = float(fill.get('feeAmount', 0))
-            fee_coin = fill.get('feeCoin', 'N/A')
-            fill_time = fill.get('fillTime', 0)
-            
-            # Обновляем статистику
-            self.update_trading_stats(inst_id, side, fill_size, fill_price, fee_amount)
-            
-            # Сохраняем данные исполнения
-            self.fills_data[trade_id] = {
-                'orderId': order_id,
-                'instId': inst_id,
-                'side': side,
-                'fillSize': fill_size,
-                'fillPrice': fill_price,
-                'orderType': order_type,
-                'feeAmount': fee_amount,
-                'feeCoin': fee_coin,
-                'fillTime': fill_time,
-                'timestamp': datetime.now()
-            }
+        for fill in rows:
+            (trade_id, order_id, inst_id, side, is_buy, fill_size, fill_price, fill_value,
+             order_type, fee_amount, fee_coin, fill_time) = self.record_fill(fill)
             
             # Форматирование времени
-            if fill_time:
-                dt = datetime.fromtimestamp(int(fill_time) / 1000)
-                time_str = dt.strftime("%H:%M:%S.%f")[:-3]
-            else:
-                time_str = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+            time_str = self.format_time_ms(fill_time or time.time_ns() // 1_000_000)
             
             # Эмодзи для стороны сделки
-            side_emoji = "🟢" if side == "buy" else "🔴"
-            side_arrow = "⬆️" if side == "buy" else "⬇️"
-            
-            # Расчет суммы исполнения
-            fill_value = fill_price * fill_size
-            
-            print(f"\\n🎯 [{time_str}] ИСПОЛНЕНИЕ #{self.update_count}")
-            print(f"💱 {inst_id}")
-            print(f"🆔 Trade ID: {trade_id}")
-            print(f"📋 Order ID: {order_id[-12:] if len(order_id) > 12 else order_id}")
-            print(f"{side_arrow} Сторона: {side_emoji} {side.upper()} │ Тип: {order_type.upper()}")
-            print(f"💰 Цена: ${fill_price:,.6f}")
-            print(f"📊 Размер: {fill_size:,.6f}")
-            print(f"💵 Сумма: ${fill_value:,.2f}")
+            fill = {
+                't': time_str,
+                'n': self.update_count,
+                'inst': inst_id,
+                'tid': trade_id,
+                'oid': order_id[-12:],
+                'arrow': "⬆️" if is_buy else "⬇️",
+                'emoji': "🟢" if is_buy else "🔴",
+                'side': side.upper(),
+                'otype': order_type.upper(),
+                'price': fill_price,
+                'size': fill_size,
+                'value': fill_value,
+            }
+            text = FILL_TEMPLATE.format_map(fill)
             
             # Информация о комиссии
             if fee_amount > 0:
-                print(f"💸 Комиссия: {fee_amount:,.6f} {fee_coin}")
+                text += FEE_TEMPLATE.format(fee_amount, fee_coin)
                 if fee_coin == 'USDT':
                     fee_percent = (fee_amount / fill_value) * 100 if fill_value > 0 else 0
-                    print(f"📈 Комиссия: {fee_percent:.4f}%")
+                    text += FEE_PERCENT_TEMPLATE.format(fee_percent)
             
             # Показываем статистику каждые 5 исполнений
             if self.update_count % 5 == 0:
-                print("─" * 50)
+                text += SEPARATOR_LINE
+            
+            # Одна запись на исполнение вместо отдельного print на каждую строку
+            self._output.put(text.encode('utf-8'))
+    
+    def record_fill(self, fill):
+        """Учет исполнения из словаря (числа от биржи - строками, пустые - ""); возвращает разобранные поля"""
+        return self._record(
+            fill.get('tradeId', 'N/A'),
+            fill.get('orderId', 'N/A'),
+            fill.get('instId', 'N/A'),
+            fill.get('side', 'N/A'),
+            to_float(fill.get('fillSize')),
+            to_float(fill.get('fillPrice')),
+            fill.get('orderType', 'N/A'),
+            to_float(fill.get('feeAmount')),
+            fill.get('feeCoin', 'N/A'),
+            to_int(fill.get('fillTime'))
+        )
+    
+    def record_entry(self, entry):
+        """Учет исполнения из FillEntry (числа приводятся так же, как из словаря); возвращает разобранные поля"""
+        return self._record(entry.tradeId, entry.orderId, entry.instId, entry.side,
+                            to_float(entry.fillSize), to_float(entry.fillPrice), entry.orderType,
+                            to_float(entry.feeAmount), entry.feeCoin, to_int(entry.fillTime))
+    
+    def _record(self, trade_id, order_id, inst_id, side, fill_size, fill_price,
+                order_type, fee_amount, fee_coin, fill_time):
+        """Учет исполнения в статистике и хранилище"""
+        self.update_count += 1
+        
+        # Сторона сделки переводится в число один раз при приеме: 1 - buy, 0 - sell
+        side_i = 1 if side == 'buy' else 0
+        
+        sid = self._sym_ids.get(inst_id)
+        if sid is None:
+            sid = self._sym_ids[inst_id] = len(self._symbols)
+            self._symbols.append(inst_id)
+        
+        # Сумма исполнения считается один раз и для статистики, и для вывода
+        fill_value = fill_price * fill_size
+        
+        # Обновляем статистику
+        self.update_trading_stats(sid, side_i, fill_value, fee_amount)
+        
+        # Сохраняем данные исполнения
+        self._store_fill(trade_id, order_id, sid, side_i, fill_size, fill_price,
+                         order_type, fee_amount, fee_coin, fill_time)
+        
+        return (trade_id, order_id, inst_id, side, side_i, fill_size, fill_price, fill_value,
+                order_type, fee_amount, fee_coin, fill_time)
+    
+    def format_time_ms(self, ts_ms):
+        """Время в формате ЧЧ:ММ:СС.ммм по метке в миллисекундах"""
+        sec, ms = divmod(ts_ms, 1000)
+        if sec != self._last_sec:
+            self._sec_prefix = time.strftime("%H:%M:%S.", time.localtime(sec))
+            self._last_sec = sec
+        return f"{self._sec_prefix}{ms:03d}"
+    
+    def _store_fill(self, trade_id, order_id, sid, side_i, fill_size, fill_price,
+                    order_type, fee_amount, fee_coin, fill_time):
+        """Добавление исполнения строкой в столбцовое хранилище"""
+        self._fill_index[trade_id] = len(self._fill_size)
+        self._fill_size.append(fill_size)
+        self._fill_price.append(fill_price)
+        self._fee_amount.append(fee_amount)
+        self._fill_time.append(fill_time)
+        self._received_at.append(time.time())
+        self._fill_is_buy.append(side_i)
+        self._order_ids.append(order_id)
+        self._fill_symbol.append(sid)
+        self._order_types.append(order_type)
+        self._fee_coins.append(fee_coin)
+    
+    def get_fill(self, trade_id):
+        """Данные исполнения по tradeId (словарь собирается по запросу) или None"""
+        row = self._fill_index.get(trade_id)
+        if row is None:
+            return None
+        return {
+            'orderId': self._order_ids[row],
+            'instId': self._symbols[self._fill_symbol[row]],
+            'side': 'buy' if self._fill_is_buy[row] else 'sell',
+            'fillSize': self._fill_size[row],
+            'fillPrice': self._fill_price[row],
+            'orderType': self._order_types[row],
+            'feeAmount': self._fee_amount[row],
+            'feeCoin': self._fee_coins[row],
+            'fillTime': self._fill_time[row],
+            'timestamp': datetime.fromtimestamp(self._received_at[row])
+        }
     
-    def update_trading_stats(self, inst_id, side, fill_size, fill_price, fee_amount):
-        """Обновить торговую статистику"""
+    def update_trading_stats(self, sid, side_i, fill_value, fee_amount):
+        """Обновить торговую статистику (sid - номер символа, уже учтенный в pairs_traded)"""
         self.trading_stats['total_fills'] += 1
-        self.trading_stats['pairs_traded'].add(inst_id)
         
-        if side == 'buy':
+        if side_i:
             self.trading_stats['buy_fills'] += 1
         else:
             self.trading_stats['sell_fills'] += 1
         
-        fill_value = fill_price * fill_size
         self.trading_stats['total_volume'] += fill_value
         self.trading_stats['total_fees'] += fee_amount
     
@@ -248,198 +379,178 @@ class SpotFillsChannel:
         pass
     async def handle_message(self, message):
         """Обработка входящих сообщений - вывод оригинальных JSON"""
-        try:
-            data = json.loads(message)
-            print(json.dumps(data, indent=4, ensure_ascii=False))
+        await self.handle_batch([message])
+    
+    async def handle_batch(self, messages):
+        """Обработка пачки сообщений - вывод оригинальных JSON с отступами (запись - в потоке вывода)"""
+        for message in messages:
+            try:
+                # Отступы для исходных байтов кадра - в потоке вывода, без повторной сериализации
+                raw = message if isinstance(message, bytes) else message.encode('utf-8')
+                self._output.put(raw, pretty_raw)
+                
+                # Разбор нужен только кадрам с ping или data (поиск подстроки в bytes - memmem в C);
+                # подтверждения подписки и прочие служебные кадры только выводятся
+                if b'"ping"' not in raw and b'"data"' not in raw:
+                    continue
+                
+                # Служебные поля и исполнения: через msgspec - только нужные поля кадра
+                if decode_frame:
+                    frame = decode_frame(message)
+                    ping = frame.ping
+                else:
+                    data = json_loads(message)
+                    ping = data.get('ping')
+                
+                # Пинг-понг
+                if ping is not None:
+                    pong_message = {'pong': ping}
+                    if self.ws:
+                        await self.ws.send(json_dumps(pong_message), text=True)
+                
+                # Учитываем исполнения в статистике сессии - по одному: ошибка в одном не теряет остальные
+                if decode_frame:
+                    record, rows = self.record_entry, frame.data
+                else:
+                    record, rows = self.record_fill, data.get('data') or ()
+                for row in rows:
+                    try:
+                        record(row)
+                    except Exception as e:
+                        print(f"❌ Ошибка обработки исполнения: {e}")
             
-            # Пинг-понг
-            if 'ping' in data:
-                pong_message = {'pong': data['ping']}
-                if self.ws:
-                    await self.ws.send(json.dumps(pong_message))
-        
-        except json.JSONDecodeError:
-            print(f"❌ Ошибка декодирования JSON: {message}")
-        except Exception as e:
-            print(f"❌ Ошибка обработки сообщения: {e}")
+            except DECODE_ERRORS:
+                print(f"❌ Ошибка декодирования JSON: {message}")
+            except Exception as e:
+                print(f"❌ Ошибка обработки сообщения: {e}")
+    
+    async def _reader_loop(self):
+        """Чтение сокета в очередь входящих сообщений"""
+        try:
+            # Текстовые фреймы получаем как bytes - без декодирования и проверки UTF-8
+            while True:
+                self._in_q.put_nowait(await self.ws.recv(decode=False))
+        except websockets.exceptions.ConnectionClosedOK:
+            pass
+        finally:
+            # None - признак закрытия соединения
+            self._in_q.put_nowait(None)
+    
     async def listen(self):
         """Прослушивание сообщений"""
+        if not self.ws:
+            return
+        reader_task = asyncio.create_task(self._reader_loop())
         try:
-            if self.ws:
-                async for message in self.ws:
-                    await self.handle_message(message)
+            while True:
+                # Ждем первое сообщение и забираем все уже накопившиеся
+                batch = [await self._in_q.get()]
+                while not self._in_q.empty():
+                    batch.append(self._in_q.get_nowait())
+                closed = batch[-1] is None
+                if closed:
+                    batch.pop()
+                await self.handle_batch(batch)
+                if closed:
+                    break
+            # Пробрасываем ошибку чтения, если соединение закрылось с ошибкой
+            await reader_task
         except websockets.exceptions.ConnectionClosed:
             print("🔌 WebSocket соединение закрыто")
         except Exception as e:
             print(f"❌ Ошибка прослушивания: {e}")
+        finally:
+            reader_task.cancel()
     
     async def disconnect(self):
         """Отключение от WebSocket"""
+        # Дожидаемся вывода всего, что уже поставлено в очередь
+        await self._output.close()
         if self.ws:
             await self.ws.close()
             print("🔌 Отключение от WebSocket")
 
-async def monitor_all_fills():
-    """Мониторинг - показывает оригинальные JSON"""
-    config = load_config()
-    if not config:
-        return
-    
-    # Проверяем наличие необходимых ключей
+def check_credentials(config):
+    """Проверка наличия ключей для аутентификации в конфигурации"""
     required_keys = ['apiKey', 'secretKey', 'passphrase']
     for key in required_keys:
         if key not in config or not config[key]:
             print(f"❌ Отсутствует {key} в конфигурации")
-            return
-    
-    print("🎯 МОНИТОРИНГ ВСЕХ ИСПОЛНЕНИЙ")
-    print("=" * 40)
-    print("🔐 Требуется аутентификация для приватных данных")
-    
+            return False
+    return True
+
+async def open_fills_client(config):
+    """Подключение и аутентификация одного клиента на весь запуск (None при ошибке)"""
     fills_client = SpotFillsChannel(config)
     
-    try:
-        if not await fills_client.connect():
-            return
-        
-        # Ждем успешной аутентификации
-        if not await fills_client.authenticate():
-            print("❌ Не удалось аутентифицироваться")
-            return
-        
-        # Небольшая пауза после аутентификации
-        await asyncio.sleep(1)
-        
-        # Подписываемся на исполнения
-        await fills_client.subscribe_fills()
-        
-        print("🔄 Мониторинг исполнений...")
-        print("💡 Нажмите Ctrl+C для остановки")
-        
-        await fills_client.listen()
-        
-    except KeyboardInterrupt:
-        print("\\n👋 Мониторинг остановлен")
-    finally:
+    if not await fills_client.connect():
+        return None
+    
+    # Ждем успешной аутентификации
+    if not await fills_client.authenticate():
+        print("❌ Не удалось аутентифицироваться")
         await fills_client.disconnect()
+        return None
+    
+    # Небольшая пауза после аутентификации
+    await asyncio.sleep(1)
+    return fills_client
 
-async def monitor_pair_fills():
+async def monitor_all_fills(fills_client):
     """Мониторинг - показывает оригинальные JSON"""
-    config = load_config()
-    if not config:
-        return
+    # Подписываемся на исполнения
+    await fills_client.subscribe_fills()
     
-    # Проверяем наличие необходимых ключей
-    required_keys = ['apiKey', 'secretKey', 'passphrase']
-    for key in required_keys:
-        if key not in config or not config[key]:
-            print(f"❌ Отсутствует {key} в конфигурации")
-            return
+    print("🔄 Мониторинг исполнений...")
+    print("💡 Нажмите Ctrl+C для остановки")
     
-    print("🎯 МОНИТОРИНГ ИСПОЛНЕНИЙ КОНКРЕТНОЙ ПАРЫ")
-    print("=" * 40)
+    await fills_client.listen()
+
+async def monitor_pair_fills(fills_client, symbol):
+    """Мониторинг - показывает оригинальные JSON"""
+    if symbol:
+        await fills_client.subscribe_fills(symbol)
+        print(f"🔄 Мониторинг исполнений для {symbol}...")
+    else:
+        await fills_client.subscribe_fills()
+        print("🔄 Мониторинг всех исполнений...")
     
-    symbol = input("💱 Введите торговую пару (например, BTCUSDT) или оставьте пустым для всех: ").strip().upper()
+    print("💡 Нажмите Ctrl+C для остановки")
     
-    fills_client = SpotFillsChannel(config)
-    
-    try:
-        if not await fills_client.connect():
-            return
-        
-        # Ждем успешной аутентификации
-        if not await fills_client.authenticate():
-            print("❌ Не удалось аутентифицироваться")
-            return
-        
-        # Небольшая задержка для аутентификации
-        await asyncio.sleep(1)
-        
-        if symbol:
-            await fills_client.subscribe_fills(symbol)
-            print(f"🔄 Мониторинг исполнений для {symbol}...")
-        else:
-            await fills_client.subscribe_fills()
-            print("🔄 Мониторинг всех исполнений...")
-        
-        print("💡 Нажмите Ctrl+C для остановки")
-        
-        await fills_client.listen()
-        
-    except KeyboardInterrupt:
-        print("\\n👋 Мониторинг остановлен")
-    finally:
-        await fills_client.disconnect()
+    await fills_client.listen()
 
-async def trading_session_analysis():
+async def trading_session_analysis(fills_client, duration):
     """Упрощенный трекер - показывает только JSON"""
-    config = load_config()
-    if not config:
-        return
-    
-    # Проверяем наличие необходимых ключей
-    required_keys = ['apiKey', 'secretKey', 'passphrase']
-    for key in required_keys:
-        if key not in config or not config[key]:
-            print(f"❌ Отсутствует {key} в конфигурации")
-            return
+    await fills_client.subscribe_fills()
     
-    print("📊 АНАЛИЗ ТОРГОВОЙ СЕССИИ")
-    print("=" * 40)
+    print(f"🔄 Анализ торговой сессии в течение {duration} секунд...")
+    print("💡 Нажмите Ctrl+C для остановки")
     
-    duration = input("⏰ Длительность сессии в секундах (по умолчанию 600): ").strip()
-    try:
-        duration = int(duration) if duration else 600
-    except ValueError:
-        duration = 600
-    
-    fills_client = SpotFillsChannel(config)
+    start_time = time.time()
     
     try:
-        if not await fills_client.connect():
-            return
+        await asyncio.wait_for(fills_client.listen(), timeout=duration)
+    except asyncio.TimeoutError:
+        end_time = time.time()
+        session_duration = end_time - start_time
         
-        # Ждем успешной аутентификации
-        if not await fills_client.authenticate():
-            print("❌ Не удалось аутентифицироваться")
-            return
-            
-        await asyncio.sleep(1)
-        await fills_client.subscribe_fills()
-        
-        print(f"🔄 Анализ торговой сессии в течение {duration} секунд...")
-        print("💡 Нажмите Ctrl+C для остановки")
-        
-        start_time = time.time()
+        print(f"\\n⏰ Торговая сессия завершена ({session_duration:.0f} сек)")
+        print("📊 ФИНАЛЬНЫЙ АНАЛИЗ:")
         
-        try:
-            await asyncio.wait_for(fills_client.listen(), timeout=duration)
-        except asyncio.TimeoutError:
-            end_time = time.time()
-            session_duration = end_time - start_time
-            
-            print(f"\\n⏰ Торговая сессия завершена ({session_duration:.0f} сек)")
-            print("📊 ФИНАЛЬНЫЙ АНАЛИЗ:")
+        # Детальная статистика
+        stats = fills_client.trading_stats
+        if stats['total_fills'] > 0:
+            avg_fills_per_minute = (stats['total_fills'] / session_duration) * 60
+            print(f"⚡ Скорость торговли: {avg_fills_per_minute:.2f} исполнений/мин")
             
-            # Детальная статистика
-            stats = fills_client.trading_stats
-            if stats['total_fills'] > 0:
-                avg_fills_per_minute = (stats['total_fills'] / session_duration) * 60
-                print(f"⚡ Скорость торговли: {avg_fills_per_minute:.2f} исполнений/мин")
-                
-                if stats['total_volume'] > 0:
-                    avg_volume_per_minute = (stats['total_volume'] / session_duration) * 60
-                    print(f"💰 Объем в минуту: ${avg_volume_per_minute:,.2f}")
-            else:
-                print("📭 Исполнений не зафиксировано")
-        
-    except KeyboardInterrupt:
-        print("\\n👋 Анализ остановлен")
-    finally:
-        await fills_client.disconnect()
+            if stats['total_volume'] > 0:
+                avg_volume_per_minute = (stats['total_volume'] / session_duration) * 60
+                print(f"💰 Объем в минуту: ${avg_volume_per_minute:,.2f}")
+        else:
+            print("📭 Исполнений не зафиксировано")
 
 async def main():
-    """Основная функция"""
+    """Основная функция: одно подключение и одна аутентификация на весь запуск"""
     print("🔌 Мониторинг спот исполнений")
     print("=" * 40)
     
@@ -451,17 +562,49 @@ async def main():
     try:
         choice = input("Ваш выбор (1-3): ").strip()
         
+        if choice not in ("1", "2", "3"):
+            print("❌ Неверный выбор")
+            return
+        
+        config = load_config()
+        if not config or not check_credentials(config):
+            return
+        
+        # Параметры режима запрашиваются до подключения
         if choice == "1":
-            await monitor_all_fills()
+            print("🎯 МОНИТОРИНГ ВСЕХ ИСПОЛНЕНИЙ")
+            print("=" * 40)
+            print("🔐 Требуется аутентификация для приватных данных")
         elif choice == "2":
-            await monitor_pair_fills()
-        elif choice == "3":
-            await trading_session_analysis()
+            print("🎯 МОНИТОРИНГ ИСПОЛНЕНИЙ КОНКРЕТНОЙ ПАРЫ")
+            print("=" * 40)
+            symbol = input("💱 Введите торговую пару (например, BTCUSDT) или оставьте пустым для всех: ").strip().upper()
         else:
-            print("❌ Неверный выбор")
+            print("📊 АНАЛИЗ ТОРГОВОЙ СЕССИИ")
+            print("=" * 40)
+            duration = input("⏰ Длительность сессии в секундах (по умолчанию 600): ").strip()
+            try:
+                duration = int(duration) if duration else 600
+            except ValueError:
+                duration = 600
+        
+        fills_client = await open_fills_client(config)
+        if not fills_client:
+            return
+        
+        try:
+            if choice == "1":
+                await monitor_all_fills(fills_client)
+            elif choice == "2":
+                await monitor_pair_fills(fills_client, symbol)
+            else:
+                await trading_session_analysis(fills_client, duration)
+        finally:
+            await fills_client.disconnect()
     
     except KeyboardInterrupt:
         print("\\n👋 Программа остановлена")
 
 if __name__ == "__main__":
+    install_uvloop()
     asyncio.run(main())
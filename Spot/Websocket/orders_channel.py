@@ -25,29 +25,103 @@ Bitget Spot WebSocket - Orders Channel (Private)
 """
 
 import asyncio
-import json
-import ssl
 import websockets
 import hmac
 import hashlib
 import base64
 import time
-from datetime import datetime
+from collections import OrderedDict
+from typing import Any, List
+from base_channel import (load_config, install_uvloop, SSL_CONTEXT, OutboundQueue, OutputWriter,
+                          json_loads, json_dumps, json_pretty, pretty_raw, DECODE_ERRORS, to_float,
+                          to_int)
 
-def load_config():
-    """Загрузка конфигурации из файла"""
-    try:
-        with open('/Users/timurbogatyrev/Documents/VS Code/Algo/ExchangeAPI/Bitget/config.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("❌ Файл config.json не найден!")
-        return None
+# msgspec (если установлен) разбирает кадр сразу в OrderUpdate, лишние поля пропускаются.
+# Числовые поля не типизируются: у неисполненных ордеров биржа присылает "" и строгий тип
+# отбросил бы весь кадр - числа приводятся в entry_fields через to_float/to_int
+try:
+    import msgspec
+    
+    class OrderUpdate(msgspec.Struct):
+        orderId: Any = 'N/A'
+        clientOid: Any = 'N/A'
+        instId: Any = 'N/A'
+        side: Any = 'N/A'
+        orderType: Any = 'N/A'
+        size: Any = '0'
+        price: Any = '0'
+        status: Any = 'N/A'
+        fillPrice: Any = '0'
+        fillSize: Any = '0'
+        fillTime: Any = 0
+        cTime: Any = 0
+        uTime: Any = 0
+    
+    class OrdersFrame(msgspec.Struct):
+        ping: Any = None
+        data: List[OrderUpdate] = []
+    
+    decode_frame = msgspec.json.Decoder(OrdersFrame).decode
+except ImportError:
+    decode_frame = None
+
+# Максимум хранимых активных ордеров (самые давно обновленные вытесняются)
+ORDERS_CACHE_SIZE = 1000
+
+# Максимум ордеров (включая завершенные), для которых помнится последний uTime - отсев повторов
+REPLAY_CACHE_SIZE = 1000
+
+# Завершенные статусы: такие ордера больше не обновляются и не хранятся
+TERMINAL_STATUSES = frozenset(('filled', 'full_fill', 'cancelled', 'canceled'))
 
-class SpotOrdersChannel:
+# Разделитель после каждых 10 обновлений (строится один раз)
+SEPARATOR_LINE = "─" * 50
+
+# Эмодзи статусов и сторон ордера (таблицы строятся один раз на модуль)
+STATUS_EMOJI = {
+    'new': '🆕',
+    'live': '🆕',
+    'partial_fill': '🟡',
+    'partially_filled': '🟡',
+    'filled': '✅',
+    'full_fill': '✅',
+    'cancelled': '❌',
+    'canceled': '❌'
+}
+SIDE_EMOJI = {
+    'buy': '🟢',
+    'sell': '🔴'
+}
+status_emoji_get = STATUS_EMOJI.get
+side_emoji_get = SIDE_EMOJI.get
+
+# Статус ордера -> ключ счетчика в order_stats
+STATUS_BUCKET = {
+    'new': 'new',
+    'live': 'new',
+    'filled': 'filled',
+    'full_fill': 'filled',
+    'cancelled': 'cancelled',
+    'canceled': 'cancelled',
+    'partial_fill': 'partially_filled',
+    'partially_filled': 'partially_filled'
+}
+
+# Неизменная часть подписываемого сообщения при аутентификации (method + request_path)
+LOGIN_SIGN_SUFFIX = b'GET/user/verify'
+
+class SpotOrdersChannel(OutboundQueue):
     def __init__(self, config):
         self.config = config
+        # Ключ кодируется один раз; HMAC с уже обработанным ключом копируется для каждой подписи
+        self._secret = config['secretKey'].encode('utf-8')
+        self._hmac_proto = hmac.new(self._secret, b'', hashlib.sha256)
         self.ws = None
-        self.orders_data = {}
+        # LRU активных ордеров: порядок - от давно обновленных к недавним
+        self.orders_data = OrderedDict()
+        # LRU последнего uTime по orderId: в отличие от orders_data хранит и завершенные ордера,
+        # чтобы повтор filled/cancelled при переподключении не выводился и не учитывался снова
+        self._last_utime = OrderedDict()
         self.update_count = 0
         self.order_stats = {
             'new': 0,
@@ -55,33 +129,37 @@ class SpotOrdersChannel:
             'cancelled': 0,
             'partially_filled': 0
         }
+        # Очередь исходящих сообщений и фоновая задача их отправки
+        self._init_outbound()
+        # Форматирование и вывод в stdout - в отдельном потоке, event loop только ставит задания в очередь
+        self._output = OutputWriter("orders-output")
         
     def generate_signature(self, timestamp, method, request_path, body=''):
         """Генерация подписи для аутентификации"""
-        message = str(timestamp) + method + request_path + body
-        signature = hmac.new(
-            self.config['secretKey'].encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).digest()
-        return base64.b64encode(signature).decode('utf-8')
+        return self._sign(f"{timestamp}{method}{request_path}{body}".encode('utf-8'))
+    
+    def _sign(self, payload):
+        """Подпись готового сообщения в bytes"""
+        h = self._hmac_proto.copy()
+        h.update(payload)
+        return base64.b64encode(h.digest()).decode('ascii')
     
     async def connect(self):
         """Подключение к WebSocket"""
         try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
             # Используем приватный WebSocket URL
             private_ws_url = self.config.get('privateWsURL', 'wss://ws.bitget.com/v2/ws/private')
             
             self.ws = await websockets.connect(
                 private_ws_url,
-                ssl=ssl_context,
+                ssl=SSL_CONTEXT,
                 ping_interval=30,
-                ping_timeout=10
+                ping_timeout=10,
+                # Кадры ордеров небольшие: без permessage-deflate (нет распаковки zlib на каждый кадр)
+                compression=None,
+                max_size=2 ** 20
             )
+            self._start_writer()
             print("✅ Подключение к Private Spot WebSocket установлено")
             return True
         except Exception as e:
@@ -90,11 +168,10 @@ class SpotOrdersChannel:
     
     async def authenticate(self):
         """Аутентификация для приватных каналов"""
-        timestamp = str(int(time.time()))
-        method = 'GET'
-        request_path = '/user/verify'
+        timestamp = str(time.time_ns() // 1_000_000_000)
         
-        signature = self.generate_signature(timestamp, method, request_path)
+        # Сообщение для подписи собирается сразу в bytes: timestamp + "GET/user/verify"
+        signature = self._sign(timestamp.encode('ascii') + LOGIN_SIGN_SUFFIX)
         
         auth_message = {
             "op": "login",
@@ -109,13 +186,13 @@ class SpotOrdersChannel:
         }
         
         if self.ws:
-            await self.ws.send(json.dumps(auth_message))
+            self._send(json_dumps(auth_message))
             print("🔐 Отправлен запрос аутентификации...")
             
             # Ждем ответ аутентификации
             try:
                 response = await asyncio.wait_for(self.ws.recv(), timeout=10)
-                data = json.loads(response)
+                data = json_loads(response)
                 if data.get('event') == 'login':
                     if str(data.get('code')) == '0':  # Преобразуем в строку для сравнения
                         print("✅ Аутентификация успешна!")
@@ -149,42 +226,90 @@ class SpotOrdersChannel:
         }
         
         if self.ws:
-            await self.ws.send(json.dumps(subscribe_message))
+            self._send(json_dumps(subscribe_message))
             if symbol:
                 print(f"📡 Подписка на ордера для {symbol}")
             else:
                 print("📡 Подписка на все ордера")
     
-    def get_status_emoji(self, *args, **kwargs):
-        """Метод удален - показываем только оригинальные JSON"""
-        pass
-    def get_side_emoji(self, *args, **kwargs):
-        """Метод удален - показываем только оригинальные JSON"""
-        pass
-    def format_order_data(self, data):
-        """Форматирование данных ордеров"""
-        if not data or 'data' not in data:
-            return
+    def get_status_emoji(self, status):
+        """Эмодзи статуса ордера"""
+        return status_emoji_get(status.lower(), '❓')
+    
+    def get_side_emoji(self, side):
+        """Эмодзи стороны ордера"""
+        return side_emoji_get(side.lower(), '⚪')
+    
+    @staticmethod
+    def order_fields(order_update):
+        """Поля обновления ордера из словаря (числа от биржи - строками, у неисполненных - "")"""
+        # Метод get связывается один раз на обновление
+        g = order_update.get
+        return (
+            g('orderId', 'N/A'),
+            g('clientOid', 'N/A'),
+            g('instId', 'N/A'),
+            g('side', 'N/A'),
+            g('orderType', 'N/A'),
+            to_float(g('size')),
+            to_float(g('price')),
+            g('status', 'N/A'),
+            to_float(g('fillPrice')),
+            to_float(g('fillSize')),
+            to_int(g('fillTime')),
+            to_int(g('cTime')),
+            to_int(g('uTime'))
+        )
+    
+    @staticmethod
+    def entry_fields(entry):
+        """Поля обновления ордера из OrderUpdate (числа приводятся так же, как из словаря)"""
+        return (entry.orderId, entry.clientOid, entry.instId, entry.side, entry.orderType,
+                to_float(entry.size), to_float(entry.price), entry.status,
+                to_float(entry.fillPrice), to_float(entry.fillSize),
+                to_int(entry.fillTime), to_int(entry.cTime), to_int(entry.uTime))
+    
+    @staticmethod
+    def order_key(order_update):
+        """Ключ (orderId, uTime) обновления из словаря"""
+        return order_update.get('orderId', 'N/A'), to_int(order_update.get('uTime'))
+    
+    @staticmethod
+    def entry_key(entry):
+        """Ключ (orderId, uTime) обновления из OrderUpdate"""
+        return entry.orderId, to_int(entry.uTime)
+    
+    def is_replay(self, order_id, update_time):
+        """Повтор или устаревшее обновление (uTime не новее учтенного) - snapshot/update при переподключении"""
+        # Без uTime повтор не отличить от нового обновления
+        if not update_time:
+            return False
+        last = self._last_utime.get(order_id)
+        return last is not None and update_time <= last
+    
+    def _remember_utime(self, order_id, update_time):
+        """Запоминание последнего uTime ордера с вытеснением самого давно обновленного"""
+        last_utime = self._last_utime
+        last_utime[order_id] = update_time
+        last_utime.move_to_end(order_id)
+        if len(last_utime) > REPLAY_CACHE_SIZE:
+            last_utime.popitem(last=False)
+    
+    def record_order(self, order_id, client_oid, inst_id, side, order_type, size, price, status,
+                     fill_price, fill_size, fill_time, create_time, update_time):
+        """Учет обновления ордера в хранилище и статистике; возвращает (номер обновления, статус в нижнем регистре)"""
+        update_count = self.update_count + 1
+        self.update_count = update_count
         
-        for order_update in data['data']:
-            self.update_count += 1
-            
-            order_id = order_update.get('orderId', 'N/A')
-            client_oid = order_update.get('clientOid', 'N/A')
-            inst_id = order_update.get('instId', 'N/A')
-            side = order_update.get('side', 'N/A')
-            order_type = order_update.get('orderType', 'N/A')
-            size = float(order_update.get('size', 0))
-            price = float(order_update.get('price', 0))
-            status = order_update.get('status', 'N/A')
-            fill_price = float(order_update.get('fillPrice', 0))
-            fill_size = float(order_update.get('fillSize', 0))
-            fill_time = order_update.get('fillTime', 0)
-            create_time = order_update.get('cTime', 0)
-            update_time = order_update.get('uTime', 0)
-            
-            # Обновляем данные ордера
-            self.orders_data[order_id] = {
+        # Статус в нижнем регистре - один раз для хранения, статистики и эмодзи
+        status_lower = status.lower()
+        
+        # Обновляем данные ордера (uTime запоминается для любого статуса, включая завершенные)
+        self._remember_utime(order_id, update_time)
+        if status_lower in TERMINAL_STATUSES:
+            self.orders_data.pop(order_id, None)
+        else:
+            self._store_order(order_id, {
                 'clientOid': client_oid,
                 'instId': inst_id,
                 'side': side,
@@ -197,57 +322,93 @@ class SpotOrdersChannel:
                 'fillTime': fill_time,
                 'createTime': create_time,
                 'updateTime': update_time,
-                'last_update': datetime.now()
-            }
-            
-            # Обновляем статистику
-            self.update_order_stats(status)
+                # Монотонное время в нс: без создания datetime, сортируется как обычное int
+                'last_update': time.monotonic_ns()
+            })
+        
+        # Обновляем статистику
+        self.update_order_stats(status_lower)
+        return update_count, status_lower
+    
+    def format_order_data(self, data):
+        """Форматирование данных ордеров (словарь или OrdersFrame; вывод - одной записью на весь кадр)"""
+        if not data:
+            return
+        if isinstance(data, dict):
+            rows = data.get('data')
+            key_of = self.order_key
+            fields_of = self.order_fields
+        else:
+            rows = data.data
+            key_of = self.entry_key
+            fields_of = self.entry_fields
+        if not rows:
+            return
+        
+        chunks = []
+        for order_update in rows:
+            # Повторы (тот же orderId и uTime) пропускаются до float() и форматирования
+            if self.is_replay(*key_of(order_update)):
+                continue
+            fields = fields_of(order_update)
+            (order_id, client_oid, inst_id, side, order_type, size, price, status,
+             fill_price, fill_size, fill_time, create_time, update_time) = fields
+            update_count, status_lower = self.record_order(*fields)
             
-            # Форматирование времени
-            if update_time:
-                dt = datetime.fromtimestamp(int(update_time) / 1000)
-                time_str = dt.strftime("%H:%M:%S.%f")[:-3]
-            else:
-                time_str = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+            # Форматирование времени (ЧЧ:ММ:СС.ммм)
+            sec, ms = divmod(update_time or time.time_ns() // 1_000_000, 1000)
+            time_str = f"{time.strftime('%H:%M:%S', time.localtime(sec))}.{ms:03d}"
             
             # Получаем эмодзи
-            status_emoji = self.get_status_emoji(status)
-            side_emoji = self.get_side_emoji(side)
+            status_emoji = status_emoji_get(status_lower, '❓')
+            side_emoji = side_emoji_get(side.lower(), '⚪')
             
-            print(f"\\n📋 [{time_str}] ОРДЕР #{self.update_count}")
-            print(f"💱 {inst_id}")
-            print(f"🆔 Order ID: {order_id}")
+            # Все строки обновления собираются и выводятся одной записью
+            parts = [
+                f"\n📋 [{time_str}] ОРДЕР #{update_count}",
+                f"💱 {inst_id}",
+                f"🆔 Order ID: {order_id}"
+            ]
             if client_oid != 'N/A':
-                print(f"👤 Client ID: {client_oid}")
-            print(f"{side_emoji} Сторона: {side.upper()} │ Тип: {order_type.upper()}")
-            print(f"{status_emoji} Статус: {status.upper()}")
-            print(f"📊 Размер: {size:,.6f}")
+                parts.append(f"👤 Client ID: {client_oid}")
+            parts.append(f"{side_emoji} Сторона: {side.upper()} │ Тип: {order_type.upper()}")
+            parts.append(f"{status_emoji} Статус: {status.upper()}")
+            parts.append(f"📊 Размер: {size:,.6f}")
             if price > 0:
-                print(f"💰 Цена: ${price:,.6f}")
+                parts.append(f"💰 Цена: ${price:,.6f}")
             
             # Информация об исполнении
             if fill_size > 0:
                 fill_percent = (fill_size / size) * 100 if size > 0 else 0
-                print(f"✅ Исполнено: {fill_size:,.6f} ({fill_percent:.2f}%)")
+                parts.append(f"✅ Исполнено: {fill_size:,.6f} ({fill_percent:.2f}%)")
                 if fill_price > 0:
-                    print(f"💵 Цена исполнения: ${fill_price:,.6f}")
-                    print(f"💸 Сумма исполнения: ${fill_price * fill_size:,.2f}")
+                    parts.append(f"💵 Цена исполнения: ${fill_price:,.6f}")
+                    parts.append(f"💸 Сумма исполнения: ${fill_price * fill_size:,.2f}")
             
             # Показываем статистику каждые 10 обновлений
-            if self.update_count % 10 == 0:
-                print("─" * 50)
+            if update_count % 10 == 0:
+                parts.append(SEPARATOR_LINE)
+            
+            chunks.append("\n".join(parts) + "\n")
+        
+        if not chunks:
+            return
+        # Текст всего кадра - одним заданием в поток вывода
+        self._output.put("".join(chunks).encode('utf-8'))
     
-    def update_order_stats(self, status):
-        """Обновить статистику ордеров"""
-        status_lower = status.lower()
-        if status_lower in ['new', 'live']:
-            self.order_stats['new'] += 1
-        elif status_lower in ['filled', 'full_fill']:
-            self.order_stats['filled'] += 1
-        elif status_lower in ['cancelled', 'canceled']:
-            self.order_stats['cancelled'] += 1
-        elif status_lower in ['partial_fill', 'partially_filled']:
-            self.order_stats['partially_filled'] += 1
+    def _store_order(self, order_id, order):
+        """Сохранение ордера в LRU с вытеснением самого давно обновленного"""
+        orders = self.orders_data
+        orders[order_id] = order
+        orders.move_to_end(order_id)
+        if len(orders) > ORDERS_CACHE_SIZE:
+            orders.popitem(last=False)
+    
+    def update_order_stats(self, status_lower):
+        """Обновить статистику ордеров (статус - в нижнем регистре)"""
+        bucket = STATUS_BUCKET.get(status_lower)
+        if bucket:
+            self.order_stats[bucket] += 1
     
     def show_orders_summary(self, *args, **kwargs):
         """Метод удален - показываем только оригинальные JSON"""
@@ -255,16 +416,43 @@ class SpotOrdersChannel:
     async def handle_message(self, message):
         """Обработка входящих сообщений - вывод оригинальных JSON"""
         try:
-            data = json.loads(message)
-            print(json.dumps(data, indent=4, ensure_ascii=False))
+            if decode_frame:
+                # Вывод - переформатирование исходных байтов, учет ордеров - по OrderUpdate
+                raw = message if isinstance(message, (bytes, bytearray)) else message.encode('utf-8')
+                frame = decode_frame(raw)
+                ping = frame.ping
+                rows = frame.data
+                key_of = self.entry_key
+                fields_of = self.entry_fields
+            else:
+                raw = data = json_loads(message)
+                ping = data.get('ping')
+                rows = data.get('data') or ()
+                key_of = self.order_key
+                fields_of = self.order_fields
+            
+            # Повторы отсеиваются только по ключу (orderId, uTime) - до разбора остальных полей
+            fresh = [row for row in rows if not self.is_replay(*key_of(row))]
+            
+            # Кадр ставится на вывод до учета ордеров: ошибка в одном обновлении не теряет кадр;
+            # кадр, целиком состоящий из повторов, не выводится
+            if fresh or not rows:
+                self._output.put(raw, pretty_raw if decode_frame else json_pretty)
             
             # Пинг-понг
-            if 'ping' in data:
-                pong_message = {'pong': data['ping']}
+            if ping is not None:
+                pong_message = {'pong': ping}
                 if self.ws:
-                    await self.ws.send(json.dumps(pong_message))
+                    self._send(json_dumps(pong_message))
+            
+            # Учет ордеров - по одному обновлению
+            for row in fresh:
+                try:
+                    self.record_order(*fields_of(row))
+                except Exception as e:
+                    print(f"❌ Ошибка обработки ордера: {e}")
         
-        except json.JSONDecodeError:
+        except DECODE_ERRORS:
             print(f"❌ Ошибка декодирования JSON: {message}")
         except Exception as e:
             print(f"❌ Ошибка обработки сообщения: {e}")
@@ -272,8 +460,11 @@ class SpotOrdersChannel:
         """Прослушивание сообщений"""
         try:
             if self.ws:
-                async for message in self.ws:
-                    await self.handle_message(message)
+                # Текстовые фреймы получаем как bytes - без декодирования и проверки UTF-8
+                while True:
+                    await self.handle_message(await self.ws.recv(decode=False))
+        except websockets.exceptions.ConnectionClosedOK:
+            pass
         except websockets.exceptions.ConnectionClosed:
             print("🔌 WebSocket соединение закрыто")
         except Exception as e:
@@ -281,6 +472,9 @@ class SpotOrdersChannel:
     
     async def disconnect(self):
         """Отключение от WebSocket"""
+        self._stop_writer()
+        # Дожидаемся вывода всего, что уже поставлено в очередь
+        await self._output.close()
         if self.ws:
             await self.ws.close()
             print("🔌 Отключение от WebSocket")
@@ -452,4 +646,5 @@ async def main():
         print("\\n👋 Программа остановлена")
 
 if __name__ == "__main__":
+    install_uvloop()
     asyncio.run(main())
@@ -25,39 +25,123 @@ Bitget Spot WebSocket - Ticker Channel (Public)
 """
 
 import asyncio
-import json
-import ssl
+import functools
 import websockets
-from datetime import datetime
+from array import array
+from collections import OrderedDict
+from websockets.extensions import permessage_deflate
+from heapq import nlargest
+from typing import Any, Dict, List
+from base_channel import (load_config, install_uvloop, SSL_CONTEXT, OutputWriter, json_loads,
+                          json_dumps, json_pretty, pretty_raw, DECODE_ERRORS, to_float, to_int)
 
-def load_config():
-    """Загрузка конфигурации из файла"""
-    try:
-        with open('/Users/timurbogatyrev/Documents/VS Code/Algo/ExchangeAPI/Bitget/config.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("❌ Файл config.json не найден!")
-        return None
+# msgspec (если установлен) разбирает кадр сразу в Ticker за один проход, лишние поля пропускаются;
+# вывод - переформатирование исходных байтов. Числовые поля не типизируются: одно "lastPr": ""
+# при строгом типе отбросило бы весь кадр - числа приводятся в entry_fields через to_float/to_int
+try:
+    import msgspec
+    
+    class Ticker(msgspec.Struct):
+        instId: Any = 'N/A'
+        # В v2 последняя цена и лучшие цены называются lastPr/bidPr/askPr
+        last: Any = msgspec.field(default=0, name='lastPr')
+        open24h: Any = 0
+        high24h: Any = 0
+        low24h: Any = 0
+        bestBid: Any = msgspec.field(default=0, name='bidPr')
+        bestAsk: Any = msgspec.field(default=0, name='askPr')
+        baseVolume: Any = 0
+        quoteVolume: Any = 0
+        change24h: Any = 0
+        ts: Any = 0
+    
+    class TickerFrame(msgspec.Struct):
+        action: str = ''
+        arg: Dict[str, Any] = {}
+        data: List[Ticker] = []
+        event: str = ''
+        code: Any = ''
+        msg: str = ''
+        ping: Any = None
+    
+    decode_frame = msgspec.json.Decoder(TickerFrame).decode
+except ImportError:
+    decode_frame = None
+
+# permessage-deflate для потока всех тикеров: однотипный JSON хорошо сжимается, а окно 2^12
+# (вместо 2^15) и memLevel=5 уменьшают память и CPU zlib на соединение
+DEFLATE_EXTENSIONS = [
+    permessage_deflate.ClientPerMessageDeflateFactory(
+        client_max_window_bits=12,
+        server_max_window_bits=12,
+        compress_settings={'memLevel': 5}
+    )
+]
+
+# Максимум хранимых символов (строка давно не обновлявшегося символа отдается новому)
+TICKERS_CACHE_SIZE = 2000
+
+@functools.lru_cache(maxsize=None)
+def build_subscribe_frame(inst_id):
+    """Готовый JSON-фрейм подписки на тикер (кэшируется на символ; "default" - все тикеры)"""
+    return json_dumps({
+        "op": "subscribe",
+        "args": [
+            {
+                "instType": "SPOT",
+                "channel": "ticker",
+                "instId": inst_id
+            }
+        ]
+    })
+
+# Готовый фрейм подписки на все тикеры
+SUBSCRIBE_ALL_FRAME = build_subscribe_frame("default")
+
+# Начало pong-ответа (значение ping дописывается как JSON)
+PONG_PREFIX = b'{"pong":'
 
 class SpotTickerChannel:
     def __init__(self, config):
         self.config = config
-        self.ws = None        
+        self.ws = None
+        # Тикеры хранятся по столбцам (SoA): строка на символ, обновление - запись скаляров в array
+        # вместо нового словаря; symbol_index - номер строки по instId (порядок LRU), symbols - обратный список
+        self.symbol_index = OrderedDict()
+        self.symbols = []
+        self.last = array('d')
+        self.open24h = array('d')
+        self.high24h = array('d')
+        self.low24h = array('d')
+        self.best_bid = array('d')
+        self.best_ask = array('d')
+        self.base_volume = array('d')
+        self.quote_volume = array('d')
+        self.change24h = array('d')
+        self.ts = array('q')
+        self.last_update = array('d')
+        self._columns = (self.last, self.open24h, self.high24h, self.low24h, self.best_bid,
+                         self.best_ask, self.base_volume, self.quote_volume, self.change24h,
+                         self.ts, self.last_update)
+        self.update_count = 0
+        # Обработчик кадров для listen(): общий до подтверждения подписки, затем - быстрый
+        self._dispatch = self.handle_message
+        # Отступы и запись в stdout - в отдельном потоке: цикл событий продолжает читать сокет,
+        # пока поток форматирует и ждет терминал
+        self._output = OutputWriter("ticker-output")
+        
     async def connect(self):
         """Подключение к WebSocket"""
         try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
             # Используем публичный WebSocket URL
             public_ws_url = self.config.get('wsURL', 'wss://ws.bitget.com/v2/ws/public')
             
             self.ws = await websockets.connect(
                 public_ws_url,
-                ssl=ssl_context,
+                ssl=SSL_CONTEXT,
                 ping_interval=30,
-                ping_timeout=10
+                ping_timeout=10,
+                extensions=DEFLATE_EXTENSIONS
             )
             print("✅ Подключение к Public WebSocket установлено")
             return True
@@ -69,62 +153,155 @@ class SpotTickerChannel:
         """Подписка на тикеры"""
         if symbol:
             # Подписка на конкретную пару
-            subscribe_message = {
-                "op": "subscribe",
-                "args": [
-                    {
-                        "instType": "SPOT",
-                        "channel": "ticker",
-                        "instId": symbol
-                    }
-                ]
-            }
+            subscribe_frame = build_subscribe_frame(symbol)
             print(f"📡 Подписка на тикер {symbol}")
         else:
             # Подписка на все тикеры
-            subscribe_message = {
-                "op": "subscribe", 
-                "args": [
-                    {
-                        "instType": "SPOT",
-                        "channel": "ticker",
-                        "instId": "default"
-                    }
-                ]
-            }
+            subscribe_frame = SUBSCRIBE_ALL_FRAME
             print("📡 Подписка на все тикеры")
         
         if self.ws:
-            await self.ws.send(json.dumps(subscribe_message))
+            # Bitget принимает op-сообщения только текстовыми фреймами
+            await self.ws.send(subscribe_frame, text=True)
+    
+    @staticmethod
+    def ticker_fields(ticker):
+        """Поля тикера из словаря (имена полей v2, числа от биржи - строками, пустые - "")"""
+        g = ticker.get
+        return (g('instId', 'N/A'), to_float(g('lastPr')), to_float(g('open24h')),
+                to_float(g('high24h')), to_float(g('low24h')), to_float(g('bidPr')),
+                to_float(g('askPr')), to_float(g('baseVolume')), to_float(g('quoteVolume')),
+                to_float(g('change24h')), to_int(g('ts')))
+    
+    @staticmethod
+    def entry_fields(ticker):
+        """Поля тикера из Ticker (числа приводятся так же, как из словаря)"""
+        return (ticker.instId, to_float(ticker.last), to_float(ticker.open24h),
+                to_float(ticker.high24h), to_float(ticker.low24h), to_float(ticker.bestBid),
+                to_float(ticker.bestAsk), to_float(ticker.baseVolume), to_float(ticker.quoteVolume),
+                to_float(ticker.change24h), to_int(ticker.ts))
+    
+    def record_ticker(self, inst_id, last, open24h, high24h, low24h, best_bid, best_ask,
+                      base_volume, quote_volume, change24h, ts, now):
+        """
+        Сохранение последнего состояния тикера по символу (строка таблицы переписывается на месте)
+        now - время приема кадра (loop.time()), одно на все тикеры кадра
+        """
+        self.update_count += 1
+        symbol_index = self.symbol_index
+        row = symbol_index.get(inst_id)
+        if row is not None:
+            symbol_index.move_to_end(inst_id)
+        elif len(symbol_index) >= TICKERS_CACHE_SIZE:
+            # Таблица заполнена: строка самого давно обновлявшегося символа переходит новому
+            _, row = symbol_index.popitem(last=False)
+            symbol_index[inst_id] = row
+            self.symbols[row] = inst_id
+        else:
+            # Новый символ - новая строка во всех столбцах
+            row = symbol_index[inst_id] = len(self.symbols)
+            self.symbols.append(inst_id)
+            for column in self._columns:
+                column.append(0)
+        self.last[row] = last
+        self.open24h[row] = open24h
+        self.high24h[row] = high24h
+        self.low24h[row] = low24h
+        self.best_bid[row] = best_bid
+        self.best_ask[row] = best_ask
+        self.base_volume[row] = base_volume
+        self.quote_volume[row] = quote_volume
+        # Биржа присылает долю (0.0123), храним проценты
+        self.change24h[row] = change24h * 100
+        self.ts[row] = ts
+        self.last_update[row] = now
+    
+    def get_ticker(self, inst_id):
+        """Последнее состояние тикера по instId (словарь собирается по запросу) или None"""
+        row = self.symbol_index.get(inst_id)
+        if row is None:
+            return None
+        return {
+            'last': self.last[row],
+            'open24h': self.open24h[row],
+            'high24h': self.high24h[row],
+            'low24h': self.low24h[row],
+            'bestBid': self.best_bid[row],
+            'bestAsk': self.best_ask[row],
+            'baseVolume': self.base_volume[row],
+            'quoteVolume': self.quote_volume[row],
+            'change24h': self.change24h[row],
+            'ts': self.ts[row],
+            'last_update': self.last_update[row]
+        }
     
     def format_ticker_data(self, data):
-        """Вывод оригинальных JSON данных от биржи"""
-        print(json.dumps(data, indent=4, ensure_ascii=False))
+        """Вывод оригинальных JSON данных от биржи (форматирование и запись - в потоке вывода)"""
+        self._output.put(data, json_pretty)
     def show_market_summary(self, *args, **kwargs):
         """Метод удален - показываем только оригинальные JSON"""
         pass
     async def handle_message(self, message):
         """Обработка входящих сообщений - вывод оригинальных JSON"""
         try:
-            data = json.loads(message)
-            print(json.dumps(data, indent=4, ensure_ascii=False))
+            # Время приема - один раз на кадр, а не на каждый тикер
+            now = asyncio.get_running_loop().time()
+            if decode_frame:
+                raw = message if isinstance(message, (bytes, bytearray)) else message.encode('utf-8')
+                # Кадр ставится на вывод до разбора (отступы для исходных байтов - в потоке вывода)
+                self._output.put(raw, pretty_raw)
+                frame = decode_frame(raw)
+                ping = frame.ping
+                if frame.event == 'subscribe':
+                    # Подписка подтверждена: дальше идут только тикеры и пинги
+                    self._dispatch = self._handle_ticker_fast
+                for ticker in frame.data:
+                    self.record_ticker(*self.entry_fields(ticker), now)
+            else:
+                data = json_loads(message)
+                ping = data.get('ping')
+                self.format_ticker_data(data)
+                for ticker in data.get('data') or ():
+                    self.record_ticker(*self.ticker_fields(ticker), now)
             
-            # Пинг-понг
-            if 'ping' in data:
-                pong_message = {'pong': data['ping']}
-                if self.ws:
-                    await self.ws.send(json.dumps(pong_message))
+            # Пинг-понг: pong собирается сразу в bytes, без промежуточного словаря
+            if ping is not None and self.ws:
+                await self.ws.send(PONG_PREFIX + json_dumps(ping) + b'}', text=True)
         
-        except json.JSONDecodeError:
+        except DECODE_ERRORS:
             print(f"❌ Ошибка декодирования JSON: {message}")
         except Exception as e:
             print(f"❌ Ошибка обработки сообщения: {e}")
+    
+    async def _handle_ticker_fast(self, message):
+        """Обработка кадров после подтверждения подписки (только при msgspec): без проверок события"""
+        try:
+            # listen() передает кадры как bytes - без проверки типа и кодирования;
+            # кадр ставится на вывод до разбора
+            self._output.put(message, pretty_raw)
+            frame = decode_frame(message)
+            if frame.ping is not None:
+                await self.ws.send(PONG_PREFIX + json_dumps(frame.ping) + b'}', text=True)
+            now = asyncio.get_running_loop().time()
+            record_ticker = self.record_ticker
+            entry_fields = self.entry_fields
+            for ticker in frame.data:
+                record_ticker(*entry_fields(ticker), now)
+        
+        except DECODE_ERRORS:
+            print(f"❌ Ошибка декодирования JSON: {message}")
+        except Exception as e:
+            print(f"❌ Ошибка обработки сообщения: {e}")
+    
     async def listen(self):
         """Прослушивание сообщений"""
         try:
             if self.ws:
-                async for message in self.ws:
-                    await self.handle_message(message)
+                # Текстовые фреймы получаем как bytes - без декодирования UTF-8 в str и обратного кодирования
+                while True:
+                    await self._dispatch(await self.ws.recv(decode=False))
+        except websockets.exceptions.ConnectionClosedOK:
+            pass
         except websockets.exceptions.ConnectionClosed:
             print("🔌 WebSocket соединение закрыто")
         except Exception as e:
@@ -132,6 +309,8 @@ class SpotTickerChannel:
     
     async def disconnect(self):
         """Отключение от WebSocket"""
+        # Дожидаемся вывода всего, что уже поставлено в очередь
+        await self._output.close()
         if self.ws:
             await self.ws.close()
             print("🔌 Отключение от WebSocket")
@@ -199,21 +378,23 @@ async def market_scanner():
             print(f"\\n⏰ Сканирование завершено ({duration} сек)")
             
             # Финальный анализ
-            if ticker_client.ticker_data:
+            if ticker_client.symbols:
                 print(f"\\n📊 РЕЗУЛЬТАТЫ СКАНИРОВАНИЯ:")
-                print(f"💱 Проанализировано пар: {len(ticker_client.ticker_data)}")
+                print(f"💱 Проанализировано пар: {len(ticker_client.symbols)}")
                 print(f"🔄 Получено обновлений: {ticker_client.update_count}")
                 
-                # Анализ волатильности
-                high_volatility = [
-                    (symbol, data) for symbol, data in ticker_client.ticker_data.items()
-                    if abs(data['change24h']) > 10
-                ]
+                # Анализ волатильности: 10 самых волатильных пар без полной сортировки (O(n log 10))
+                change24h = ticker_client.change24h
+                high_volatility = nlargest(
+                    10,
+                    (row for row, change in enumerate(change24h) if abs(change) > 10),
+                    key=lambda row: abs(change24h[row])
+                )
                 
                 if high_volatility:
                     print(f"\\n⚡ ВЫСОКАЯ ВОЛАТИЛЬНОСТЬ (>10%):")
-                    for symbol, data in high_volatility[:10]:
-                        print(f"   {symbol}: {data['change24h']:+.2f}%")
+                    for row in high_volatility:
+                        print(f"   {ticker_client.symbols[row]}: {change24h[row]:+.2f}%")
                 
                 ticker_client.show_market_summary()
             else:
@@ -247,5 +428,6 @@ async def main():
         print("\\n👋 Программа остановлена")
 
 if __name__ == "__main__":
+    install_uvloop()
     asyncio.run(main())
 
@@ -20,37 +20,67 @@ Bitget Spot WebSocket - Trades Channel
 """
 
 import asyncio
-import json
-import ssl
+import functools
 import websockets
-from datetime import datetime
+from typing import Any
+from base_channel import (load_config, install_uvloop, SSL_CONTEXT, OutputWriter, json_loads,
+                          json_dumps, json_pretty, pretty_raw, DECODE_ERRORS)
 
-def load_config():
-    """Загрузка конфигурации из файла"""
-    try:
-        with open('/Users/timurbogatyrev/Documents/VS Code/Algo/ExchangeAPI/Bitget/config.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("❌ Файл config.json не найден!")
-        return None
+# msgspec (если установлен) достает из кадра только поле ping, а вывод - переформатирование
+# исходных байтов: сделки кадра не превращаются в Python-словари и строки
+try:
+    import msgspec
+    
+    class TradesEnvelope(msgspec.Struct):
+        ping: Any = None
+    
+    decode_envelope = msgspec.json.Decoder(TradesEnvelope).decode
+except ImportError:
+    decode_envelope = None
+
+@functools.lru_cache(maxsize=None)
+def build_subscribe_frame(inst_id):
+    """Готовый JSON-фрейм подписки на сделки (кэшируется на символ; символ экранируется кодировщиком)"""
+    return json_dumps({
+        "op": "subscribe",
+        "args": [
+            {
+                "instType": "SPOT",
+                "channel": "trade",
+                "instId": inst_id
+            }
+        ]
+    })
+
+# Начало pong-ответа (значение ping дописывается как JSON)
+PONG_PREFIX = b'{"pong":'
+
+# Размер очереди принятых кадров: при заполнении чтение сокета ждет обработчик
+# (сделки не отбрасываются, давление передается в TCP-окно)
+INBOX_SIZE = 1000
 
 class SpotTradesChannel:
     def __init__(self, config):
         self.config = config
         self.ws = None
-        self.symbols = []        
+        self.symbols = []
+        # Отступы и запись в stdout - в отдельном потоке; кадры, накопленные за время записи,
+        # уходят в терминал одной записью
+        self._output = OutputWriter("trades-output")
+        # Кадры между чтением сокета и обработкой
+        self._in_q = asyncio.Queue(maxsize=INBOX_SIZE)
+        
     async def connect(self):
         """Подключение к WebSocket"""
         try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
             self.ws = await websockets.connect(
                 self.config['wsURL'],
-                ssl=ssl_context,
+                ssl=SSL_CONTEXT,
                 ping_interval=30,
-                ping_timeout=10
+                ping_timeout=10,
+                # Кадры сделок небольшие: без permessage-deflate (нет распаковки zlib на каждый кадр)
+                compression=None,
+                max_size=2 ** 20
             )
             print("✅ Подключение к Spot WebSocket установлено")
             return True
@@ -60,55 +90,70 @@ class SpotTradesChannel:
     
     async def subscribe_trades(self, symbol):
         """Подписка на сделки конкретного символа"""
-        subscribe_message = {
-            "op": "subscribe",
-            "args": [
-                {
-                    "instType": "SPOT",
-                    "channel": "trade",
-                    "instId": symbol.upper()
-                }
-            ]
-        }
-        
-        await self.ws.send(json.dumps(subscribe_message))
+        # Bitget принимает op-сообщения только текстовыми фреймами
+        await self.ws.send(build_subscribe_frame(symbol.upper()), text=True)
         self.symbols.append(symbol.upper())
         print(f"📡 Подписка на сделки {symbol}")
     
     def format_trade_data(self, data):
-        """Вывод оригинальных JSON данных от биржи"""
-        print(json.dumps(data, indent=4, ensure_ascii=False))
+        """Вывод оригинальных JSON данных от биржи (отступы и запись - в потоке вывода)"""
+        self._output.put(data, json_pretty)
     
     async def handle_message(self, message):
         """Обработка входящих сообщений - вывод оригинальных JSON"""
         try:
-            data = json.loads(message)
-            print(json.dumps(data, indent=4, ensure_ascii=False))
+            if decode_envelope:
+                raw = message if isinstance(message, (bytes, bytearray)) else message.encode('utf-8')
+                ping = decode_envelope(raw).ping
+                self._output.put(raw, pretty_raw)
+            else:
+                data = json_loads(message)
+                ping = data.get('ping')
+                self.format_trade_data(data)
             
-            # Пинг-понг
-            if 'ping' in data:
-                pong_message = {'pong': data['ping']}
-                if self.ws:
-                    await self.ws.send(json.dumps(pong_message))
+            # Пинг-понг: pong собирается сразу в bytes, без промежуточного словаря
+            if ping is not None and self.ws:
+                await self.ws.send(PONG_PREFIX + json_dumps(ping) + b'}', text=True)
         
-        except json.JSONDecodeError:
+        except DECODE_ERRORS:
             print(f"❌ Ошибка декодирования JSON: {message}")
         except Exception as e:
             print(f"❌ Ошибка обработки сообщения: {e}")
     
+    async def _reader_loop(self):
+        """Чтение сокета: кадры только ставятся в очередь, разбор и вывод - в _consumer_loop"""
+        # Текстовые фреймы получаем как bytes - без декодирования UTF-8 в str и обратного кодирования
+        while True:
+            await self._in_q.put(await self.ws.recv(decode=False))
+    
+    async def _consumer_loop(self):
+        """Обработка принятых сообщений отдельно от чтения сокета"""
+        while True:
+            message = await self._in_q.get()
+            await self.handle_message(message)
+    
     async def listen(self):
         """Прослушивание сообщений"""
+        consumer_task = asyncio.create_task(self._consumer_loop())
         try:
             if self.ws:
-                async for message in self.ws:
-                    await self.handle_message(message)
+                await self._reader_loop()
+        except websockets.exceptions.ConnectionClosedOK:
+            pass
         except websockets.exceptions.ConnectionClosed:
             print("🔌 WebSocket соединение закрыто")
         except Exception as e:
             print(f"❌ Ошибка прослушивания: {e}")
+        finally:
+            consumer_task.cancel()
+            # Дообрабатываем то, что уже принято
+            while not self._in_q.empty():
+                await self.handle_message(self._in_q.get_nowait())
     
     async def disconnect(self):
         """Отключение от WebSocket"""
+        # Дожидаемся вывода всего, что уже поставлено в очередь
+        await self._output.close()
         if self.ws:
             await self.ws.close()
             print("🔌 Отключение от WebSocket")
@@ -246,4 +291,5 @@ async def main():
         print("\n👋 Программа остановлена")
 
 if __name__ == "__main__":
+    install_uvloop()
     asyncio.run(main())